@@ -0,0 +1,117 @@
+import os
+import time
+import argparse
+import resource
+import tempfile
+
+import rich
+import rich.markup
+from rich.table import Table
+
+import numpy as np
+import cv2
+
+import download_webcam as download
+
+
+def load_frames(video_path: str, frame_count: int, raw_stream: bool) -> tuple[list[np.typing.NDArray[np.uint8]], float]:
+    # Decoded up front, so decoding doesn't count towards the encoder
+    capture = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < frame_count:
+        ret, image = capture.read()
+        if not ret:
+            break
+        frames.append(image)
+
+    # Snippets already have the real rate, only the stream reports twice of it, see the StreamMeta of run_capture
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    if raw_stream:
+        fps /= 2
+    capture.release()
+    return frames, fps
+
+
+def children_cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure_quality(filepath: str, frames: list[np.typing.NDArray[np.uint8]]) -> float:
+    capture = cv2.VideoCapture(filepath)
+    total_psnr = 0.0
+    count = 0
+    for frame in frames:
+        ret, image = capture.read()
+        if not ret:
+            break
+        total_psnr += cv2.PSNR(frame, image)
+        count += 1
+
+    capture.release()
+    return total_psnr / count if count != 0 else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the CPU usage of the snippet encoder profiles on a recorded video")
+    parser.add_argument("video", help="video to replay, e.g. a snippet of the webcam")
+    parser.add_argument("--raw-stream", action="store_true", help="the video is a recording of the webcam stream instead of a snippet")
+    parser.add_argument("--frames", type=int, default=300, help="number of frames to encode per profile")
+    parser.add_argument("--profiles", type=lambda x: x.split(","), default=list(download.encoder_profiles.keys()), help="comma separated profile names")
+    args = parser.parse_args()
+
+    download.output_video = True
+
+    frames, fps = load_frames(args.video, args.frames, args.raw_stream)
+    if len(frames) == 0:
+        rich.print(f"[bold red]Couldn't read any frames from {rich.markup.escape(args.video)}")
+        return
+
+    height, width = frames[0].shape[:2]
+    rich.print(f"[bold]Encoding {len(frames)} frames of {width}x{height} at {fps:.1f} fps")
+
+    table = Table(title="Encoder profiles")
+    table.add_column("Profile")
+    table.add_column("Python (ms/frame)", justify="right")
+    table.add_column("FFmpeg (ms/frame)", justify="right")
+    table.add_column("Total (ms/frame)", justify="right")
+    table.add_column("Realtime", justify="right")
+    table.add_column("Bitrate (kbit/s)", justify="right")
+    table.add_column("PSNR (dB)", justify="right")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in args.profiles:
+            filepath = os.path.join(temp_dir, f"{name}.mts")
+
+            start_time = time.perf_counter()
+            start_cpu = time.process_time()
+            start_children_cpu = children_cpu_time()
+
+            writer = download.FFmpegVideoWriter(filepath, width, height, fps, download.encoder_profiles[name])
+            for frame in frames:
+                # Waits for the encoder, so every frame gets encoded
+                writer.write(frame, block=True)
+            writer.release()
+            writer.wait()
+
+            # Includes the writer thread
+            python_cpu = time.process_time() - start_cpu
+            duration = time.perf_counter() - start_time
+            ffmpeg_cpu = children_cpu_time() - start_children_cpu
+
+            bitrate = os.path.getsize(filepath) * 8 / (len(frames) / fps) / 1000
+
+            table.add_row(
+                name,
+                f"{python_cpu / len(frames) * 1000:.2f}",
+                f"{ffmpeg_cpu / len(frames) * 1000:.2f}",
+                f"{(python_cpu + ffmpeg_cpu) / len(frames) * 1000:.2f}",
+                f"{len(frames) / fps / duration:.1f}x",
+                f"{bitrate:.0f}",
+                f"{measure_quality(filepath, frames):.2f}",
+            )
+
+    rich.print(table)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import json
+import argparse
+
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+schedule_dir = "../data/schedule"
+compiled_path = "../data/schedule/compiled.npy"
+
+# Same as knownDirections in website/common/direction.ts
+known_directions = {
+    'Chur': 'chur',
+    'Chur GB': 'chur',
+    'Landquart': 'davos',
+    'Landquart GB': 'chur',
+    'Davos Platz': 'davos',
+    'Filisur': 'filisur',
+    'Pontresina': 'moritz',
+    'Samedan': 'moritz',
+    'St. Moritz': 'moritz',
+    'Tirano': 'moritz',
+    'Zermatt': 'chur',
+}
+
+# Minutes since 1970-01-01 in local time, so every pass can be sorted and searched by a single key
+epoch = date(1970, 1, 1)
+
+# Stopping trains have an arrival and departure, other trains only a transit time
+no_time = -1
+
+pass_dtype = np.dtype([
+    ('start', np.int32),
+    ('end', np.int32),
+    ('arrival', np.int16),
+    ('departure', np.int16),
+    ('number', 'S8'),
+    ('classifier', 'S8'),
+    ('direction', 'S8'),
+])
+
+
+def load_json_with_comments(path: str):
+    # Same as the website, lines starting with '//' are comments
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().split('\n')
+
+    return json.loads('\n'.join('' if line.lstrip().startswith('//') else line for line in lines))
+
+
+def parse_minute(time: str | None) -> int:
+    if not time:
+        return no_time
+
+    hour, minute = time.split(':')
+    return int(hour) * 60 + int(minute)
+
+
+def parse_date(value: str | None) -> date | None:
+    return datetime.fromisoformat(value).date() if value else None
+
+
+def is_train_applicable(train: dict, day: date) -> bool:
+    # Weekdays are written as ISO numbers, i.e. 1 is Monday and 7 is Sunday
+    weekdays = train.get('applicable_weekdays')
+    if weekdays and str(day.isoweekday()) not in weekdays:
+        return False
+
+    start_date = parse_date(train.get('applicable_start_date'))
+    end_date = parse_date(train.get('applicable_end_date'))
+    return (start_date is None or start_date <= day) and (end_date is None or end_date >= day)
+
+
+def compile_schedules(schedule_dir: str) -> np.typing.NDArray:
+    passes = []
+
+    for entry in load_json_with_comments(os.path.join(schedule_dir, "index.json")):
+        trains = load_json_with_comments(os.path.join(schedule_dir, entry['file_path']))
+
+        # Times are parsed once per train, not once per day
+        compiled_trains = []
+        for train in trains:
+            arrival = parse_minute(train.get('arrival_time'))
+            departure = parse_minute(train.get('departure_time'))
+            transit = parse_minute(train.get('transit_time'))
+
+            start = arrival if arrival != no_time else (transit if transit != no_time else departure)
+            end = departure if departure != no_time else (transit if transit != no_time else arrival)
+            if start == no_time:
+                continue
+
+            information = train.get('information') or {}
+            compiled_trains.append((train, start, end, (
+                arrival if arrival != no_time else transit,
+                departure if departure != no_time else transit,
+                train['number'],
+                information.get('classifier', ''),
+                known_directions.get(information.get('destination'), ''),
+            )))
+
+        day = parse_date(entry['start_date'])
+        end_date = parse_date(entry['end_date'])
+        while day <= end_date:
+            day_start = (day - epoch).days * 24 * 60
+            for train, start, end, info in compiled_trains:
+                if is_train_applicable(train, day):
+                    passes.append((day_start + start, day_start + end, *info))
+
+            day += timedelta(days=1)
+
+    compiled = np.array(passes, dtype=pass_dtype)
+    compiled.sort(order=['start', 'end', 'number'])
+    return compiled
+
+
+def format_minute(minute: int) -> str:
+    return "--:--" if minute == no_time else f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def to_minutes(time: datetime) -> int:
+    return (time.date() - epoch).days * 24 * 60 + time.hour * 60 + time.minute
+
+
+def load_compiled(path: str = compiled_path) -> np.typing.NDArray:
+    return np.load(path, allow_pickle=False)
+
+
+def trains_in_timespan(passes: np.typing.NDArray, start_time: datetime, end_time: datetime) -> np.typing.NDArray:
+    # Same overlap check as getTrainsInTimespan on the website
+    start = to_minutes(start_time)
+    end = to_minutes(end_time)
+
+    # Passes are sorted by their start, which is at most the longest stop before their end
+    max_duration = int(np.max(passes['end'] - passes['start'])) if len(passes) != 0 else 0
+    lower = np.searchsorted(passes['start'], start - max_duration, side='left')
+    upper = np.searchsorted(passes['start'], end, side='right')
+
+    candidates = passes[lower:upper]
+    return candidates[candidates['end'] >= start]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the timetables into a sorted array of train passes")
+    parser.add_argument("-i", "--schedule-dir", default=schedule_dir)
+    parser.add_argument("-o", "--output", default=compiled_path)
+    parser.add_argument("--query", metavar="TIME", help="print trains around a time in format YYYY-MM-DD_HH-MM-SS instead")
+    parser.add_argument("--variance", type=int, default=5, help="minutes around the queried time")
+    args = parser.parse_args()
+
+    if args.query:
+        passes = load_compiled(args.output)
+        time = datetime.strptime(args.query, '%Y-%m-%d_%H-%M-%S')
+        for train in trains_in_timespan(passes, time - timedelta(minutes=args.variance), time + timedelta(minutes=args.variance)):
+            print(f"{train['number'].decode():>5} {train['classifier'].decode():<6} {train['direction'].decode():<8} "
+                  f"{format_minute(train['arrival'])} - {format_minute(train['departure'])}")
+        return
+
+    passes = compile_schedules(args.schedule_dir)
+    np.save(args.output, passes, allow_pickle=False)
+
+    print(f"Compiled {len(passes)} train passes into '{args.output}' ({os.path.getsize(args.output) / 1024:.0f} KiB)")
+
+if __name__ == "__main__":
+    main()
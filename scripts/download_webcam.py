@@ -1,17 +1,24 @@
 import os
+import json
+import time
+import zlib
 import subprocess
 
 from datetime import datetime
 from dataclasses import dataclass
 from enum import Enum
-from queue import Queue
-from threading import Thread
+from queue import Queue, Empty, Full
+from threading import Thread, Lock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process, JoinableQueue, Queue as MPQueue, shared_memory, resource_tracker
 
 from dotenv import load_dotenv
 
 import numpy as np
 import cv2
 
+import generate_thumbnails as thumbnails
+
 webcam_url = "https://grischuna-cam.weta.ch/cgi-bin/mjpg/video.cgi?channel=0&subtype=1"
 
 video_source = webcam_url
@@ -33,6 +40,27 @@ debug_mode = True
 debug_log = False
 output_video = video_source == webcam_url or not debug_mode
 
+# Run the analysis in a separate process, with frames passed through shared memory
+analysis_process = False
+shared_frame_slots = 8
+# Seconds between reports of check frames dropped because the analysis fell behind
+dropped_frame_report_interval = 60.0
+
+# Only encode changed frames and keep the previous one on screen until then, needs the live stream's wallclock time
+skip_duplicate_encoding = False
+# Frames are compared by a tiny downsampled copy for skip_duplicate_encoding, differing by at most the tolerance counts as a duplicate
+duplicate_fingerprint_size = (32, 18)
+duplicate_tolerance = 1
+# Seconds of exact duplicates until the stream is reported as frozen, a quiet scene still has sensor noise
+frozen_stream_duration = 30.0
+
+# Precompute the thumbnail and scrub sprite of every flushed recording, needs THUMBNAIL_CACHE
+flush_thumbnails = True
+
+# Events for each client, before a slow client starts missing them
+event_client_buffer = 100
+event_keepalive_interval = 15.0
+
 class DayMode(Enum):
     BOTH = 0
     DAY = 1
@@ -57,6 +85,10 @@ class Area:
     mask_image: np.typing.NDArray[np.uint8] = None
     mask_area: int = 0
 
+    # Scores of the last check, for the event stream
+    last_sum: int = 0
+    last_coverage: float = 0.0
+
     computed_points: np.typing.NDArray[np.int32] = None
 
     def compute(self, width: int, height: int):
@@ -73,6 +105,10 @@ class Area:
         area_diff = cv2.bitwise_and(image_diff, self.mask_image)
         area_sum = np.sum(area_diff)
 
+        if update:
+            self.last_sum = int(area_sum)
+            self.last_coverage = np.count_nonzero(area_diff)/self.mask_area
+
         for condition in self.triggers:
             if weather_noise > condition.max_weather_noise or sky_light > condition.max_sky_light:
                 continue
@@ -172,6 +208,72 @@ scan_areas = [
 ]
 
 
+## Event stream (see WEBCAM_EVENT_STREAM_PORT)
+
+event_clients: set[Queue[str]] = set()
+event_clients_lock = Lock()
+
+class EventStreamHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/events":
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        client: Queue[str] = Queue(maxsize=event_client_buffer)
+        with event_clients_lock:
+            event_clients.add(client)
+
+        try:
+            while True:
+                try:
+                    message = client.get(timeout=event_keepalive_interval)
+                except Empty:
+                    message = ": keepalive\n\n"
+
+                self.wfile.write(message.encode())
+                self.wfile.flush()
+        except OSError:
+            # Client disconnected
+            pass
+        finally:
+            with event_clients_lock:
+                event_clients.discard(client)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_event_stream():
+    port = os.getenv("WEBCAM_EVENT_STREAM_PORT")
+    if not port:
+        return
+
+    # Only for local consumers
+    server = ThreadingHTTPServer(("127.0.0.1", int(port)), EventStreamHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"Publishing events on http://127.0.0.1:{port}/events")
+
+def publish_event(type: str, **data):
+    with event_clients_lock:
+        if len(event_clients) == 0:
+            return
+
+        event = {"type": type, "time": datetime.now().isoformat(), **data}
+        message = f"event: {type}\ndata: {json.dumps(event)}\n\n"
+        for client in event_clients:
+            try:
+                client.put_nowait(message)
+            except Full:
+                # Slow clients miss events instead of blocking the analysis
+                pass
+
+
 @dataclass 
 class SnippetCollection:
     previous_file: str = None
@@ -190,7 +292,9 @@ class SnippetCollection:
     def start_recording(self, time: float, skip_start_buffer: bool):
         now = datetime.now()
         print(f"== Started Recording at {now} ==")
-        if len(self.segments) == 0:
+        # Started again before the previous recording was flushed
+        continued = len(self.segments) != 0
+        if not continued:
             if True or skip_start_buffer or not self.previous_file:
                 self.segments = [self.current_file]
             else:
@@ -204,15 +308,18 @@ class SnippetCollection:
             self.start_time = time
 
         self.recording = True
+        publish_event("recording_started", stream_time=time, target_file=self.target_file, continued=continued)
 
     def stop_recording(self, time: float):
         if time - self.start_time < minimum_recording_duration:
             print(f"== Cancelled Recording at {datetime.now()} ==")
+            publish_event("recording_cancelled", stream_time=time, duration=time - self.start_time)
             self.recording = False
             self.segments = []
             return
             
         print(f"== Stopped Recording at {datetime.now()} ==")
+        publish_event("recording_stopped", stream_time=time, duration=time - self.start_time, target_file=self.target_file)
         self.recording = False
 
 
@@ -230,6 +337,7 @@ class SnippetCollection:
     def flush(self):
         if not output_video:
             print(f" => {self.target_file}  ({len(self.segments)} segments)")
+            publish_event("flush_done", target_file=self.target_file, segments=len(self.segments), success=True)
             self.segments = []
             return
 
@@ -246,31 +354,223 @@ class SnippetCollection:
             "-c:v", "copy", self.target_file
         ])
 
+        def wait_for_flush(target_file: str, segment_count: int):
+            success = process.wait() == 0
+            publish_event("flush_done", target_file=target_file, segments=segment_count, success=success)
+
+            if success and flush_thumbnails:
+                try:
+                    thumbnails.generate_for_recording(target_file)
+                except Exception as e:
+                    print(f"Failed to generate thumbnails of '{target_file}': {e}")
+
+        Thread(target=wait_for_flush, args=[self.target_file, len(self.segments)], daemon=True).start()
+
         print(f" => {self.target_file}  ({len(self.segments)} segments)")
         self.segments = []
 
+@dataclass
+class EncoderProfile:
+    crf: int = 22
+    preset: str = None
+    tune: str = None
+    threads: int = None
+    # Seconds between keyframes
+    gop_duration: float = None
+    # Convert to I420 before piping, which is half the size of bgr24 and saves ffmpeg the conversion
+    send_yuv: bool = False
+
+# Compare them with benchmark_encoder.py
+encoder_profiles = {
+    "default": EncoderProfile(),
+    "fast": EncoderProfile(preset="veryfast", gop_duration=10.0, send_yuv=True),
+    "low_cpu": EncoderProfile(crf=24, preset="ultrafast", tune="zerolatency", threads=2, gop_duration=10.0, send_yuv=True),
+}
+encoder_profile = "default"
+
+# Frames buffered for all snippet writers of a stream, before frames are dropped instead of blocking the capture
+writer_buffer_frames = 32
+# Seconds without progress until ffmpeg is considered stalled and gets replaced
+writer_stall_timeout = 10.0
+writer_max_restarts = 3
+
+class FramePool:
+    # Frames are copied into a fixed pool, so a slow ffmpeg can't block the capture, I420 needs even dimensions
+    def __init__(self, width: int, height: int, send_yuv: bool):
+        self.send_yuv = send_yuv
+        frame_shape = (height * 3 // 2, width) if send_yuv else (height, width, 3)
+        self.frames = np.empty((writer_buffer_frames, *frame_shape), np.uint8)
+        self.free: Queue[int] = Queue()
+        for index in range(writer_buffer_frames):
+            self.free.put(index)
+
 class FFmpegVideoWriter:
-    def __init__(self, filepath: str, width: int, height: int, fps: int):
+    def __init__(self, filepath: str, width: int, height: int, fps: int, profile: EncoderProfile = None, variable_frame_rate: bool = False, pool: FramePool = None):
+        self.filepath = filepath
+        self.profile = profile or encoder_profiles[encoder_profile]
+        self.variable_frame_rate = variable_frame_rate
+
         if not output_video:
             return
 
-        self.process = subprocess.Popen([
-            "ffmpeg", "-hide_banner", "-loglevel", "error",
-            "-f", "rawvideo", "-r", str(fps), "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-i", "pipe:0",
-            "-f", "mpegts", "-c:v", "h264", "-crf", "22", "-pix_fmt", "yuv420p", filepath
-        ], stdin=subprocess.PIPE)
+        self.width = width
+        self.height = height
+        self.fps = fps
+
+        self.process: subprocess.Popen = None
+        self.written_count = 0
+        self.dropped_count = 0
+        self.restart_count = 0
+        self.finishing = False
+        self.start_time = time.monotonic()
+        self.last_progress = self.start_time
+
+        # The snippets of a stream share one pool, only the frames still pending count towards this writer
+        self.pool = pool or FramePool(width, height, self.profile.send_yuv)
+        self.pending_frames: Queue[int | None] = Queue()
+        self.queued_count = 0
+        self.processed_count = 0
+
+        self.start_process()
+
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def start_process(self):
+        input_format = "yuv420p" if self.profile.send_yuv else "bgr24"
+        encoder_args = ["-crf", str(self.profile.crf)]
+        if self.profile.preset:
+            encoder_args += ["-preset", self.profile.preset]
+        if self.profile.tune:
+            encoder_args += ["-tune", self.profile.tune]
+        if self.profile.threads:
+            encoder_args += ["-threads", str(self.profile.threads)]
+        if self.profile.gop_duration:
+            encoder_args += ["-g", str(max(1, round(self.profile.gop_duration * self.fps)))]
+
+        # Frames are timestamped when ffmpeg receives them, so skipped frames keep showing the previous one
+        if self.variable_frame_rate:
+            input_args = ["-use_wallclock_as_timestamps", "1"]
+            encoder_args += ["-fps_mode", "vfr"]
+            offset = time.monotonic() - self.start_time
+        else:
+            input_args = ["-r", str(self.fps)]
+            offset = self.written_count / self.fps
+
+        # Replacements append to the same file and continue its timestamps, mpegts can simply be concatenated
+        with open(self.filepath, "xb" if self.process is None else "ab") as output:
+            self.process = subprocess.Popen([
+                "ffmpeg", "-hide_banner", "-loglevel", "error",
+                "-f", "rawvideo", *input_args, "-pix_fmt", input_format, "-s", f"{self.width}x{self.height}", "-i", "pipe:0",
+                "-f", "mpegts", "-c:v", "h264", *encoder_args, "-pix_fmt", "yuv420p",
+                "-output_ts_offset", f"{offset:.6f}", "pipe:1"
+            ], stdin=subprocess.PIPE, stdout=output)
+
+    def restart_process(self):
+        self.process.kill()
+        self.process.wait()
+
+        # Don't keep replacing an ffmpeg which can't encode at all
+        if self.restart_count >= writer_max_restarts:
+            return
+
+        self.restart_count += 1
+        print(f"Replacing ffmpeg of {self.filepath} after {self.written_count} frames ({self.restart_count}/{writer_max_restarts})")
+        self.start_process()
+
+    def run(self):
+        while True:
+            index = self.pending_frames.get()
+            self.last_progress = time.monotonic()
+            if index is None:
+                break
+
+            try:
+                # Write the buffer directly instead of copying it with tobytes()
+                self.process.stdin.write(self.pool.frames[index].data)
+                self.written_count += 1
+            except OSError:
+                # Died or was killed by the watchdog
+                self.dropped_count += 1
+                self.restart_process()
+
+            self.last_progress = time.monotonic()
+            self.processed_count += 1
+            self.pool.free.put(index)
+
+        self.finishing = True
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+
+        if self.dropped_count != 0:
+            print(f"Dropped {self.dropped_count} frames of {self.filepath}")
+
+    def check_stalled(self):
+        # Watchdog, killing ffmpeg makes the writer thread replace it
+        busy = self.finishing or self.processed_count != self.queued_count
+        if busy and time.monotonic() - self.last_progress > writer_stall_timeout:
+            print(f"FFmpeg of {self.filepath} stalled for {writer_stall_timeout}s, killing it")
+            self.last_progress = time.monotonic()
+            self.process.kill()
+
+    def acquire(self, block: bool = False) -> int:
+        while True:
+            self.check_stalled()
+
+            try:
+                # Blocking writes keep checking, since a hung ffmpeg never frees a frame
+                return self.pool.free.get(block=block, timeout=1.0 if block else None)
+            except Empty:
+                if not block:
+                    return None
+
+    def buffer(self, block: bool = False) -> tuple[int, cv2.typing.MatLike]:
+        # Lets the capture decode straight into the pool, only possible when the frames are sent as they are
+        if not output_video or self.pool.send_yuv:
+            return None, None
+
+        index = self.acquire(block)
+        return index, self.pool.frames[index] if index is not None else None
 
-    def write(self, image: np.typing.NDArray[np.uint8]):
+    def write(self, image: np.typing.NDArray[np.uint8], block: bool = False, index: int = None):
         if not output_video:
             return
 
-        self.process.stdin.write(image.tobytes())
+        if index is None:
+            index = self.acquire(block)
+            if index is None:
+                self.dropped_count += 1
+                return
+
+            if self.pool.send_yuv:
+                cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420, dst=self.pool.frames[index])
+            else:
+                np.copyto(self.pool.frames[index], image)
+
+        self.queued_count += 1
+        self.pending_frames.put(index)
+
+    def discard(self, index: int):
+        # Buffer which isn't written after all
+        if index is not None:
+            self.pool.free.put(index)
 
     def release(self):
         if not output_video:
             return
 
-        self.process.stdin.close()
+        self.pending_frames.put(None)
+
+    def wait(self):
+        if not output_video:
+            return
+
+        while self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+            self.check_stalled()
 
 
 ## Debug controls
@@ -287,15 +587,182 @@ class StreamMeta:
     height: int
     fps: float
 
+@dataclass
+class DuplicateFrame:
+    # Replaces a frame which is exactly the same as the previously analysed one
+    pass
+
+@dataclass
+class DroppedFrame:
+    # Replaces a frame the analysis had no room for, so the stream time still advances
+    pass
 
-def run_analysis(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideoWriter]):
+@dataclass
+class StreamHealth:
+    frozen: bool
+    # Seconds of stream time
+    duration: float
+
+
+## Shared memory transport (see analysis_process)
+
+@dataclass
+class SharedFrames:
+    name: str
+    slot_count: int
+    meta: StreamMeta
+
+@dataclass
+class FrameSlot:
+    index: int
+
+@dataclass
+class SnippetWriter:
+    # Stands in for the FFmpegVideoWriter, which is owned by the capture process
+    filepath: str
+    # Increases with every snippet
+    index: int
+
+    def wait(self):
+        while self.index not in finished_writers:
+            finished_writers.add(finished_writer_queue.get())
+
+    def forget_older(self):
+        # Only the latest writer is ever waited for, so older ones can be dropped
+        while True:
+            try:
+                finished_writers.add(finished_writer_queue.get_nowait())
+            except Empty:
+                break
+
+        finished_writers.difference_update([index for index in finished_writers if index < self.index])
+
+finished_writer_queue: MPQueue = None
+finished_writers: set[int] = set()
+
+class SharedFrameRing:
+    def __init__(self, meta: StreamMeta, slot_count: int, name: str = None):
+        self.slot_count = slot_count
+        frame_size = meta.height * meta.width * 3
+
+        self.memory = shared_memory.SharedMemory(name=name, create=name is None, size=frame_size * slot_count)
+        if name is not None:
+            # Only the creating process should clean up the memory
+            resource_tracker.unregister(self.memory._name, "shared_memory")
+
+        self.name = self.memory.name
+        self.frames = np.ndarray((slot_count, meta.height, meta.width, 3), dtype=np.uint8, buffer=self.memory.buf)
+
+    def close(self, unlink: bool = False):
+        # All views into the frames have to be dropped before closing
+        self.frames = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+class SharedFrameSender:
+    def __init__(self, queue: JoinableQueue, released_slots: MPQueue, finished_writers: MPQueue):
+        self.queue = queue
+        self.released_slots = released_slots
+        self.finished_writers = finished_writers
+
+        self.ring: SharedFrameRing = None
+        self.free_slots: list[int] = []
+        self.current_slot: int = None
+
+        self.writer_count = 0
+        self.dropped_count = 0
+        self.reported_count = 0
+        self.last_report = time.monotonic()
+
+    def start(self, meta: StreamMeta):
+        old_ring = self.ring
+        self.current_slot = None
+
+        self.ring = SharedFrameRing(meta, shared_frame_slots)
+        self.free_slots = list(range(shared_frame_slots))
+        self.queue.put(SharedFrames(self.ring.name, shared_frame_slots, meta))
+
+        if old_ring:
+            old_ring.close(unlink=True)
+
+    def buffer(self) -> cv2.typing.MatLike:
+        # Frames are captured straight into shared memory, so sending them doesn't need a copy
+        if self.ring is None:
+            return None
+
+        if self.current_slot is None:
+            self.collect_released()
+            if len(self.free_slots) == 0:
+                return None
+            self.current_slot = self.free_slots.pop()
+
+        return self.ring.frames[self.current_slot]
+
+    def send(self, image: cv2.typing.MatLike) -> bool:
+        self.report_dropped()
+
+        slot = self.buffer()
+        if slot is None:
+            # Analysis is too far behind, so there is no free slot
+            self.dropped_count += 1
+            self.queue.put(DroppedFrame())
+            return False
+
+        # Frames captured before the ring existed still have to be copied
+        if not np.may_share_memory(image, slot):
+            np.copyto(slot, image)
+
+        self.queue.put(FrameSlot(self.current_slot))
+        self.current_slot = None
+        return True
+
+    def report_dropped(self):
+        if self.dropped_count == self.reported_count or time.monotonic() - self.last_report < dropped_frame_report_interval:
+            return
+
+        print(f"Dropped {self.dropped_count - self.reported_count} analysis frames in the last {time.monotonic() - self.last_report:.0f}s, since no shared frame slot was free ({self.dropped_count} total)")
+        self.reported_count = self.dropped_count
+        self.last_report = time.monotonic()
+
+    def send_writer(self, writer: FFmpegVideoWriter):
+        # Notify the analysis once the snippet is fully written
+        def wait_for_writer():
+            writer.wait()
+            self.finished_writers.put(index)
+
+        index = self.writer_count
+        self.writer_count += 1
+
+        Thread(target=wait_for_writer, daemon=True).start()
+        self.queue.put(SnippetWriter(writer.filepath, index))
+
+    def collect_released(self):
+        while True:
+            try:
+                name, index = self.released_slots.get_nowait()
+            except Empty:
+                return
+
+            # Slots of old rings are gone already
+            if self.ring and name == self.ring.name:
+                self.free_slots.append(index)
+
+
+def run_analysis(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideoWriter | SharedFrames | FrameSlot | SnippetWriter | DuplicateFrame | DroppedFrame | StreamHealth], released_slots: MPQueue = None):
     meta: StreamMeta = None
     collection = SnippetCollection()
 
     total_count = 0
     weather_mask = None
     prev_image = None
-    prev_writer: FFmpegVideoWriter = None
+    prev_writer: FFmpegVideoWriter | SnippetWriter = None
+
+    # Only used when running as a separate process
+    shared_frames: SharedFrameRing = None
+    prev_slot: int = None
+
+    start_event_stream()
 
     while True:
         obj = queue.get()
@@ -306,14 +773,51 @@ def run_analysis(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVide
 
             # New snippet
             if output_video and prev_writer is not None and not collection.recording and len(collection.segments) != 0:
-                prev_writer.process.wait()
+                prev_writer.wait()
 
             collection.next_snippet(obj)
-        elif isinstance(obj, FFmpegVideoWriter):
+        elif isinstance(obj, (FFmpegVideoWriter, SnippetWriter)):
             # Old writer
             prev_writer = obj
-        elif isinstance(obj, StreamMeta):
-            # Metadata update
+            if isinstance(obj, SnippetWriter):
+                obj.forget_older()
+        elif isinstance(obj, StreamHealth):
+            if obj.frozen:
+                print(f"== Stream frozen for {obj.duration:.0f}s at {datetime.now()} ==")
+                publish_event("stream_frozen", duration=obj.duration)
+            else:
+                print(f"== Stream recovered after {obj.duration:.0f}s at {datetime.now()} ==")
+                publish_event("stream_recovered", duration=obj.duration)
+        elif isinstance(obj, DuplicateFrame):
+            # Same as analysing a frame without any difference, which triggers no area
+            if prev_image is not None:
+                if collection.recording:
+                    collection.stop_recording(total_count/meta.fps)
+
+                total_count += int(check_interval*meta.fps)
+        elif isinstance(obj, DroppedFrame):
+            # Nothing is known about the frame, so recording just continues as before
+            if prev_image is not None:
+                total_count += int(check_interval*meta.fps)
+        elif isinstance(obj, (StreamMeta, SharedFrames)):
+            if isinstance(obj, SharedFrames):
+                # Frames of the old ring can't be compared to the new ones anyway, and views have to be dropped before closing
+                prev_image = None
+                curr_image = None
+                prev_slot = None
+                if shared_frames:
+                    shared_frames.close()
+
+                try:
+                    shared_frames = SharedFrameRing(obj.meta, obj.slot_count, name=obj.name)
+                except FileNotFoundError:
+                    # Capture already moved on to a newer ring
+                    shared_frames = None
+
+                obj = obj.meta
+
+            # Metadata update, after the first one the capture reconnected
+            publish_event("stream_reconnected" if meta else "stream_connected", width=obj.width, height=obj.height, fps=obj.fps)
             meta = obj
             print(f"Got metadata: {meta}")
 
@@ -327,11 +831,21 @@ def run_analysis(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVide
                 area.compute(meta.width, meta.height)
         else:
             # Frame to analyse
-            curr_image: cv2.Mat = obj
+            curr_slot: int = None
+            if isinstance(obj, FrameSlot):
+                if shared_frames is None:
+                    queue.task_done()
+                    continue
+
+                curr_slot = obj.index
+                curr_image: cv2.Mat = shared_frames.frames[curr_slot]
+            else:
+                curr_image: cv2.Mat = obj
             
             ## Detect difference
             if prev_image is None:
                 prev_image = curr_image
+                prev_slot = curr_slot
                 queue.task_done()
                 continue
 
@@ -339,6 +853,11 @@ def run_analysis(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVide
             image_diff[image_diff < 20] = 0
             prev_image = curr_image
 
+            # Previous frame isn't needed anymore, so capture can reuse its slot
+            if prev_slot is not None:
+                released_slots.put((shared_frames.name, prev_slot))
+            prev_slot = curr_slot
+
             diff_sum = np.sum(image_diff)
             weather_sum = np.sum(cv2.bitwise_and(image_diff, weather_mask))
             sky_sum = np.sum(cv2.bitwise_and(curr_image, weather_mask))
@@ -352,13 +871,16 @@ def run_analysis(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVide
             ## Analyse areas
             any_active = False
             should_skip_start_buffer = False
-            for area in scan_areas:
+            for index, area in enumerate(scan_areas):
                 area_triggered = area.trigger_check(image_diff, weather_sum, sky_sum, update=True)
 
                 if area_triggered:
                     any_active = True
                     should_skip_start_buffer = should_skip_start_buffer or area.skip_start_buffer
 
+                    publish_event("area_triggered", area=index, stream_time=total_count/meta.fps, sum=area.last_sum, coverage=area.last_coverage,
+                                  weather_noise=int(weather_sum), sky_light=int(sky_sum))
+
                 if debug_mode:
                     color = (0, 255, 0) if area_triggered else (255, 0, 0)
                     cv2.polylines(debug_diff, [area.computed_points], isClosed=True, color=color, thickness=2)
@@ -381,7 +903,14 @@ def run_analysis(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVide
         queue.task_done()
 
 
-def run_capture(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideoWriter]):
+def is_duplicate(fingerprint: cv2.typing.MatLike, other: cv2.typing.MatLike) -> bool:
+    if other is None:
+        return False
+
+    return int(cv2.absdiff(fingerprint, other).max()) <= duplicate_tolerance
+
+
+def run_capture(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideoWriter | DuplicateFrame | StreamHealth], frames: SharedFrameSender = None):
     capture = cv2.VideoCapture(video_source)
     writer = None
 
@@ -397,13 +926,35 @@ def run_capture(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideo
     check_time = 0
 
     curr_image: cv2.typing.MatLike = None
+    capture_image: cv2.typing.MatLike = None
     ret: bool = None
+    pool: FramePool = None
+
+    prev_fingerprint: cv2.typing.MatLike = None
+    prev_checksum: int = None
+    analysed_checksum: int = None
+    duplicate_count = 0
+    frozen = False
 
     try:
         while True:
             ## Capture current
-            ret, curr_image = capture.read(curr_image)
+            # Slots of the previous connection's ring are unmapped once the new ring is started
+            pool_index, image_buffer = None, None
+            if frames and meta:
+                image_buffer = frames.buffer()
+            elif writer:
+                # Decoded straight into the encoder's pool, so writing it doesn't need a copy
+                pool_index, image_buffer = writer.buffer(block=video_source != webcam_url)
+
+            ret, curr_image = capture.read(capture_image if image_buffer is None else image_buffer)
+            if image_buffer is None:
+                capture_image = curr_image
+
             if not ret:
+                if writer:
+                    writer.discard(pool_index)
+
                 # Attempt 100 times
                 fail_count += 1
                 if fail_count > 100:
@@ -412,7 +963,7 @@ def run_capture(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideo
 
                     if writer and output_video:
                         writer.release()
-                        writer.process.wait()
+                        writer.wait()
                     return
                 continue
             else:
@@ -426,16 +977,48 @@ def run_capture(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideo
                     int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
                     capture.get(cv2.CAP_PROP_FPS) / 2,
                 )
-                queue.put(meta)
+                if frames:
+                    frames.start(meta)
+                else:
+                    queue.put(meta)
+
+                if output_video:
+                    pool = FramePool(meta.width, meta.height, encoder_profiles[encoder_profile].send_yuv)
 
                 snippet_time = int(snippet_duration*meta.fps)
                 check_time = int(check_interval*meta.fps)
 
+            ## Detect duplicates of the previous frame
+            duplicate = False
+            if skip_duplicate_encoding:
+                fingerprint = cv2.resize(curr_image, duplicate_fingerprint_size, interpolation=cv2.INTER_AREA)
+                duplicate = is_duplicate(fingerprint, prev_fingerprint)
+                prev_fingerprint = fingerprint
+
+            # Only a frozen camera repeats the exact same image
+            checksum = zlib.crc32(curr_image)
+            exact_duplicate = checksum == prev_checksum
+            prev_checksum = checksum
+
+            if exact_duplicate:
+                duplicate_count += 1
+                if not frozen and duplicate_count >= frozen_stream_duration*meta.fps:
+                    frozen = True
+                    queue.put(StreamHealth(True, duplicate_count/meta.fps))
+            else:
+                if frozen:
+                    frozen = False
+                    queue.put(StreamHealth(False, duplicate_count/meta.fps))
+                duplicate_count = 0
+
             ## Setup output writer for current snippet
             if writer is None or snippet_count >= snippet_time:
                 if writer:
                     writer.release()
-                    queue.put(writer)
+                    if frames:
+                        frames.send_writer(writer)
+                    else:
+                        queue.put(writer)
 
                 now = datetime.now()
                 hourly_now = now.replace(minute=0, second=0, microsecond=0)
@@ -450,19 +1033,32 @@ def run_capture(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideo
                     os.mkdir(target_dir)
 
                 filepath = f"{target_dir}/{now.strftime('%Y-%m-%d_%H-%M-%S')}.mts"
-                writer = FFmpegVideoWriter(filepath, meta.width, meta.height, meta.fps)
+                writer = FFmpegVideoWriter(filepath, meta.width, meta.height, meta.fps, variable_frame_rate=skip_duplicate_encoding, pool=pool)
                 snippet_count = 0
                 
                 queue.put(filepath)
 
-            writer.write(curr_image)
+            # Every snippet needs at least its first frame
+            if not (skip_duplicate_encoding and duplicate and snippet_count != 0):
+                # Replays can't time out, so they wait for the encoder instead of dropping frames
+                writer.write(curr_image, block=video_source != webcam_url, index=pool_index)
+            else:
+                writer.discard(pool_index)
             snippet_count += 1
 
             if check_count > 0:
                 check_count -= 1
             else:
                 check_count = check_time
-                queue.put(curr_image.copy())
+                # Only an exact copy is guaranteed to have no difference, small changes can still trigger an area
+                if checksum == analysed_checksum:
+                    queue.put(DuplicateFrame())
+                elif frames:
+                    if frames.send(curr_image):
+                        analysed_checksum = checksum
+                else:
+                    queue.put(curr_image.copy())
+                    analysed_checksum = checksum
 
             if not debug_mode:
                 continue
@@ -476,6 +1072,10 @@ def run_capture(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideo
             if auto_fastforward and auto_playback:
                 continue
 
+            # The encoder may not have read the frame yet
+            if pool_index is not None:
+                curr_image = curr_image.copy()
+
             for area in scan_areas:
                 cv2.polylines(curr_image, [area.computed_points], isClosed=True, color=(0, 0, 255), thickness=1)
 
@@ -520,11 +1120,11 @@ def run_capture(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideo
     except:
         if writer and output_video:
             writer.release()
-            writer.process.wait()
+            writer.wait()
         
         raise
 
-def capture_worker(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideoWriter]):
+def capture_worker(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideoWriter], frames: SharedFrameSender = None):
     if debug_mode:
         cv2.namedWindow(window_diff, cv2.WINDOW_NORMAL)
         cv2.namedWindow(window_normal, cv2.WINDOW_NORMAL)
@@ -533,17 +1133,44 @@ def capture_worker(queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVi
         while True:
             print(f"Attemping capture on {datetime.now()}")
             try:
-                run_capture(queue)
+                run_capture(queue, frames)
             except Exception as e:
                 print(f"Unexpected exception: {e}")
     else:
-        run_capture(queue)
+        run_capture(queue, frames)
         queue.put("TERMINATE")
 
 
+def analysis_worker(queue: JoinableQueue, released_slots: MPQueue, finished_writers: MPQueue):
+    global finished_writer_queue
+    finished_writer_queue = finished_writers
+
+    run_analysis(queue, released_slots)
+
+
 def main():
     load_dotenv()
 
+    if analysis_process and debug_mode:
+        print("Debug mode needs the analysis in the same process, falling back to a thread")
+    elif analysis_process:
+        queue = JoinableQueue()
+        released_slots = MPQueue()
+        finished_writers = MPQueue()
+
+        analysis = Process(target=analysis_worker, args=[queue, released_slots, finished_writers])
+        analysis.start()
+
+        frames = SharedFrameSender(queue, released_slots, finished_writers)
+        try:
+            capture_worker(queue, frames)
+        finally:
+            if frames.ring:
+                frames.ring.close(unlink=True)
+
+        analysis.join()
+        return
+
     queue: Queue[StreamMeta | str | cv2.typing.MatLike | FFmpegVideoWriter] = Queue(maxsize=0)
     capture_thread = Thread(target=capture_worker, args=[queue])
     capture_thread.daemon = True
@@ -6,14 +6,17 @@ source ../.env
 FILE_URL=$(curl https://www.rhb.ch/de/bahnfans/lokdienste/ | grep -oP 'https://assets.eu.ctfassets.net/h76myjvzsgnd/lokdienstPdf/[0-9a-f]{32}/[a-zA-Z0-9._]+\.pdf' | head -n 1)
 FILE_NAME=$(basename $FILE_URL)
 
-if [ -f $LOCOMOTIVE_ALLOCATIONS_ARCHIVE/$FILE_NAME ]; then
-    exit 0
+# Download
+if [ ! -f $LOCOMOTIVE_ALLOCATIONS_ARCHIVE/$FILE_NAME ]; then
+    wget -O $LOCOMOTIVE_ALLOCATIONS_ARCHIVE/$FILE_NAME $FILE_URL
 fi
 
-# Download
-wget -O $LOCOMOTIVE_ALLOCATIONS_ARCHIVE/$FILE_NAME $FILE_URL
-# Parse
+# Parse (skipped if the output is still current, which needs the cache)
+CACHE_ARGS=()
+if [ -n "${LOCOMOTIVE_ALLOCATIONS_CACHE:-}" ]; then
+    CACHE_ARGS=(--cache-dir "$LOCOMOTIVE_ALLOCATIONS_CACHE")
+fi
 
 source .venv/bin/activate
-python3 parse_locomotive_allocations.py $LOCOMOTIVE_ALLOCATIONS_ARCHIVE/$FILE_NAME
+python3 parse_locomotive_allocations.py --jobs $(nproc) "${CACHE_ARGS[@]}" "$LOCOMOTIVE_ALLOCATIONS_ARCHIVE/$FILE_NAME"
 
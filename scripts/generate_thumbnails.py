@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+import numpy as np
+import cv2
+
+# Same as the website, which uses ffmpegthumbnailer with '-t00:00:10'
+thumbnail_time = 10.0
+
+# Evenly spaced frames side by side, tile i shows the recording at (i + 0.5) / count of its duration
+sprite_frame_count = 20
+sprite_tile_width = 160
+sprite_quality = 80
+
+
+def output_paths(video_path: str, archive_dir: str, cache_dir: str) -> tuple[str, str]:
+    # Same layout as the thumbnail route of the website, i.e. '<day>/<name>.png'
+    base = os.path.splitext(os.path.join(cache_dir, os.path.relpath(video_path, archive_dir)))[0]
+    return f"{base}.png", f"{base}.sprite.jpg"
+
+
+def is_current(video_path: str, thumbnail_path: str, sprite_path: str) -> bool:
+    video_time = os.path.getmtime(video_path)
+    return all(os.path.exists(path) and os.path.getmtime(path) >= video_time for path in [thumbnail_path, sprite_path])
+
+
+def write_atomic(path: str, image: np.typing.NDArray[np.uint8], params: list[int] = []):
+    # The website may read the file at any time, the extension has to stay for imwrite
+    temp_path = f"{os.path.splitext(path)[0]}.tmp{os.path.splitext(path)[1]}"
+    if not cv2.imwrite(temp_path, image, params):
+        raise OSError(f"Couldn't write '{temp_path}'")
+    os.replace(temp_path, path)
+
+
+def generate(video_path: str, thumbnail_path: str, sprite_path: str):
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise OSError(f"Couldn't open '{video_path}'")
+
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    if frame_count <= 0 or fps <= 0:
+        raise ValueError(f"Unknown length of '{video_path}'")
+
+    thumbnail_index = min(int(thumbnail_time * fps), frame_count - 1)
+    sprite_indices = [min(int((i + 0.5) * frame_count / sprite_frame_count), frame_count - 1) for i in range(sprite_frame_count)]
+    wanted_indices = set(sprite_indices) | {thumbnail_index}
+
+    # Single pass, only the wanted frames are converted
+    frames: dict[int, np.typing.NDArray[np.uint8]] = {}
+    last_frame = None
+    index = 0
+    while index <= max(wanted_indices) and capture.grab():
+        if index in wanted_indices:
+            ret, last_frame = capture.retrieve()
+            if ret:
+                frames[index] = last_frame
+        index += 1
+    capture.release()
+
+    if last_frame is None:
+        raise ValueError(f"Couldn't decode any frames of '{video_path}'")
+
+    # The frame count of the container can be too high, the last frame is used instead
+    height, width = last_frame.shape[:2]
+    tile_height = round(height * sprite_tile_width / width)
+    tiles = [cv2.resize(frames.get(i, last_frame), (sprite_tile_width, tile_height), interpolation=cv2.INTER_AREA) for i in sprite_indices]
+
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    write_atomic(thumbnail_path, frames.get(thumbnail_index, last_frame))
+    write_atomic(sprite_path, np.hstack(tiles), [cv2.IMWRITE_JPEG_QUALITY, sprite_quality])
+
+
+def generate_for_recording(video_path: str, force: bool = False) -> bool:
+    # Used by download_webcam.py once a recording is flushed
+    archive_dir = os.getenv("WEBCAM_VIDEO_ARCHIVE")
+    cache_dir = os.getenv("THUMBNAIL_CACHE")
+    if not archive_dir or not cache_dir:
+        return False
+
+    thumbnail_path, sprite_path = output_paths(video_path, archive_dir, cache_dir)
+    if not force and is_current(video_path, thumbnail_path, sprite_path):
+        return False
+
+    generate(video_path, thumbnail_path, sprite_path)
+    return True
+
+
+def find_recordings(archive_dir: str) -> list[str]:
+    # Recordings and day videos are stored as '<day>/<name>.mp4'
+    video_paths = []
+    for day_dir in sorted(os.listdir(archive_dir)):
+        day_path = os.path.join(archive_dir, day_dir)
+        if not os.path.isdir(day_path):
+            continue
+
+        video_paths += [os.path.join(day_path, file) for file in sorted(os.listdir(day_path)) if file.endswith(".mp4")]
+
+    return video_paths
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Precompute thumbnails and scrub sprites of all recordings")
+    parser.add_argument("-a", "--archive-dir", default=os.getenv("WEBCAM_VIDEO_ARCHIVE"))
+    parser.add_argument("-c", "--cache-dir", default=os.getenv("THUMBNAIL_CACHE"))
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of processes to decode recordings with")
+    parser.add_argument("-f", "--force", action="store_true", help="generate again, even if the outputs are current")
+    args = parser.parse_args()
+
+    video_paths = find_recordings(args.archive_dir)
+    pending = []
+    for video_path in video_paths:
+        thumbnail_path, sprite_path = output_paths(video_path, args.archive_dir, args.cache_dir)
+        if args.force or not is_current(video_path, thumbnail_path, sprite_path):
+            pending.append((video_path, thumbnail_path, sprite_path))
+
+    print(f"Generating thumbnails of {len(pending)} of {len(video_paths)} recordings with {args.jobs} processes")
+
+    start_time = time.perf_counter()
+    failures = []
+
+    # Each worker decodes whole recordings
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = {executor.submit(generate, *paths): paths[0] for paths in pending}
+        for future in as_completed(futures):
+            video_path = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failures.append((video_path, e))
+                print(f"Failed to generate thumbnails of '{video_path}': {e}")
+
+    duration = time.perf_counter() - start_time
+    generated_count = len(pending) - len(failures)
+
+    print(f"Generated thumbnails of {generated_count} recordings in {duration:.1f}s, {generated_count / duration if duration > 0 else 0:.2f} recordings/s")
+    print(f"Skipped {len(video_paths) - len(pending)} up-to-date recordings, {len(failures)} failed")
+    for video_path, e in failures:
+        print(f" - {video_path}: {type(e).__name__}: {e}")
+
+    if len(failures) != 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import argparse
+
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+import compile_schedule as schedule
+
+allocation_dir = "../data/locomotive_allocations"
+
+# Same defaults as the categorize page on the website
+regular_variance = 20
+freight_variance = 60
+
+
+def find_recordings(archive_dir: str) -> list[tuple[int, str]]:
+    # Recordings are stored as '<day>/<%Y-%m-%d_%H-%M-%S>.mp4'
+    recordings = []
+    for day_dir in sorted(os.listdir(archive_dir)):
+        day_path = os.path.join(archive_dir, day_dir)
+        if not os.path.isdir(day_path):
+            continue
+
+        for file in os.listdir(day_path):
+            name, ext = os.path.splitext(file)
+            if ext != ".mp4":
+                continue
+
+            try:
+                recorded_at = datetime.strptime(name, '%Y-%m-%d_%H-%M-%S')
+            except ValueError:
+                continue
+
+            recordings.append((schedule.to_minutes(recorded_at), f"{day_dir}/{file}"))
+
+    recordings.sort()
+    return recordings
+
+
+def load_allocations(day: str, cache: dict[str, dict | None]) -> dict | None:
+    # Trains of a day's allocations grouped by number, loaded once per day
+    if day in cache:
+        return cache[day]
+
+    try:
+        with open(os.path.join(allocation_dir, f"{day.replace('-', '_')}.min.json"), "r") as f:
+            allocations = json.load(f)
+    except OSError:
+        cache[day] = None
+        return None
+
+    trains = {}
+    for train in allocations["trains"]:
+        trains.setdefault(train["number"], []).append(train)
+
+    cache[day] = trains
+    return trains
+
+
+def find_locomotives(allocations: dict | None, train) -> list[dict]:
+    # Same matching as getLocomotives on the website
+    if allocations is None:
+        return []
+
+    min_time = train['arrival'] if train['arrival'] != schedule.no_time else None
+    max_time = train['departure'] if train['departure'] != schedule.no_time else None
+
+    for allocated_train in allocations.get(train['number'].decode(), []):
+        departure = allocated_train["departure_time"]["hour"] * 60 + allocated_train["departure_time"]["minute"]
+        arrival = allocated_train["arrival_time"]["hour"] * 60 + allocated_train["arrival_time"]["minute"]
+
+        if (not min_time or departure <= min_time) and (not max_time or arrival >= max_time):
+            return allocated_train["locomotives"]
+
+    return []
+
+
+def match_recordings(recordings: list[tuple[int, str]], passes, regular_variance: int, freight_variance: int) -> dict[str, list[dict]]:
+    # Both lists are sorted by time, so the window of candidate passes only ever moves forward
+    max_variance = max(regular_variance, freight_variance)
+    max_duration = int((passes['end'] - passes['start']).max()) if len(passes) != 0 else 0
+
+    starts = passes['start']
+    ends = passes['end']
+    is_freight = passes['classifier'] == b'G'
+
+    allocation_cache = {}
+    suggestions = {}
+
+    lower = 0
+    for recorded_at, recording in recordings:
+        while lower < len(passes) and starts[lower] < recorded_at - max_variance - max_duration:
+            lower += 1
+
+        candidates = []
+        i = lower
+        while i < len(passes) and starts[i] <= recorded_at + max_variance:
+            variance = freight_variance if is_freight[i] else regular_variance
+
+            # Minutes between the recording and the train being at the station
+            distance = max(0, starts[i] - recorded_at, recorded_at - ends[i])
+            if distance <= variance:
+                candidates.append((int(distance), i))
+            i += 1
+
+        day = recording.split('/')[0]
+        allocations = load_allocations(day, allocation_cache)
+
+        suggestions[recording] = []
+        for distance, i in sorted(candidates):
+            train = passes[i]
+            suggestions[recording].append({
+                "number": train['number'].decode(),
+                "classifier": train['classifier'].decode(),
+                "direction": train['direction'].decode() or None,
+                "arrival_time": schedule.format_minute(train['arrival']),
+                "departure_time": schedule.format_minute(train['departure']),
+                "distance_minutes": distance,
+                "locomotives": find_locomotives(allocations, train),
+            })
+
+    return suggestions
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Match all recordings against the schedule and locomotive allocations")
+    parser.add_argument("-a", "--archive-dir", default=os.getenv("WEBCAM_VIDEO_ARCHIVE"))
+    parser.add_argument("-s", "--schedule", default=schedule.compiled_path, help="compiled schedule, see compile_schedule.py")
+    parser.add_argument("-o", "--output", default=None, help="defaults to 'suggestions.json' inside the archive")
+    parser.add_argument("--regular-variance", type=int, default=regular_variance, help="minutes around a recording for regular trains")
+    parser.add_argument("--freight-variance", type=int, default=freight_variance, help="minutes around a recording for freight trains")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+
+    passes = schedule.load_compiled(args.schedule)
+    recordings = find_recordings(args.archive_dir)
+    suggestions = match_recordings(recordings, passes, args.regular_variance, args.freight_variance)
+
+    output = args.output or os.path.join(args.archive_dir, "suggestions.json")
+    temp_output = f"{output}.tmp"
+    with open(temp_output, "w") as f:
+        json.dump(suggestions, f)
+    os.replace(temp_output, output)
+
+    print(f"Matched {len(recordings)} recordings against {len(passes)} train passes in {time.perf_counter() - start_time:.1f}s -> '{output}'")
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,14 @@ import sys
 import math
 import json
 import re
+import bisect
+import argparse
+import hashlib
+import gzip
+import glob
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 @dataclass
 class Route:
@@ -84,191 +92,402 @@ def format_time(hours):
 
     return "%d:%02d" % (hours, round(minutes))
 
-def main(input_path, output_dir):
-    pdf = pdfplumber.open(input_path)
-
-    all_locos = []
-    target_date = None
-
-    for page in pdf.pages:
-        words = page.extract_words(keep_blank_chars=True)
+# Vertical text is split into one word per line, which are stacked directly below each other
+vertical_line_offset = 0.95
+vertical_line_error = 0.15
+vertical_column_error = 0.0001
+
+def word_key(word):
+    # Words are compared by value, not identity
+    return tuple(sorted(word.items()))
+
+def merge_vertical_words(words):
+    # Words are bucketed into columns twice as wide as the allowed error,
+    # so a matching word is always in the same or a neighbouring bucket
+    column_width = 2 * vertical_column_error
+
+    entries = []
+    keys = []
+    alive = []
+    key_indices = {}
+    columns = {}
+
+    def add_entry(word):
+        idx = len(entries)
+        key = word_key(word)
+
+        entries.append(word)
+        keys.append(key)
+        alive.append(True)
+        key_indices.setdefault(key, []).append(idx)
+
+        return idx
+
+    for word in words:
+        idx = add_entry(word)
+        columns.setdefault(math.floor(word['x0'] / column_width), []).append((word['top'], idx))
+    for column in columns.values():
+        column.sort()
+
+    def find_next(head_idx, last_word):
+        head = entries[head_idx]
+        head_column = math.floor(head['x0'] / column_width)
+        target_top = last_word['bottom'] - vertical_line_offset
+
+        # Earliest word in list order wins, same as a linear scan would
+        next_idx = None
+        for column_idx in range(head_column - 1, head_column + 2):
+            column = columns.get(column_idx)
+            if not column:
+                continue
 
-        if not target_date:
-            for word in words:
-                m = re.match(r'(\d{2}).(\d{2}).(\d{4})\s*\[\w+\]', word['text'])
-                if m:
-                    target_date = m.groups()
-                    break
+            # Slightly widened range to not miss any words due to rounding
+            i = bisect.bisect_left(column, (target_top - vertical_line_error - 1e-6,))
+            while i < len(column) and column[i][0] < target_top + vertical_line_error + 1e-6:
+                idx = column[i][1]
+                i += 1
 
-        # Find locomotives
-        locos = []
-        loco_y = []
-        curr_loco = Locomotive(None, None, None)
-        curr_y = 0
-        curr_prev_lines = []
-        curr_prev_y = 0
-        curr_next_lines = []
-        curr_next_y = 0
-
-        loco_x = 0
-        from_x = 0
-        to_x = 0
-        for word in words:
-            if word['text'] == 'FZG':
-                loco_x = word['x0']
-                continue
-            if word['text'] == 'Von':
-                from_x = word['x0'] + 0.9125434179773606
+                if not alive[idx] or (next_idx is not None and idx > next_idx):
+                    continue
+                if keys[idx] == keys[head_idx]:
+                    continue
+                if approx_equal(target_top, entries[idx]['top'], vertical_line_error) and approx_equal(head['x0'], entries[idx]['x0'], vertical_column_error):
+                    next_idx = idx
+
+        return next_idx
+
+    for head_idx in range(len(words)):
+        head = entries[head_idx]
+
+        h_word = head['text']
+        used_indices = [head_idx]
+        last_word = head
+        max_x1 = head['x1']
+
+        while (next_idx := find_next(head_idx, last_word)) is not None:
+            next_word = entries[next_idx]
+
+            h_word += next_word['text']
+            used_indices.append(next_idx)
+            last_word = next_word
+            max_x1 = max(max_x1, next_word['x1'])
+
+        if len(used_indices) > 1:
+            for key in set(keys[idx] for idx in used_indices):
+                for idx in key_indices[key]:
+                    alive[idx] = False
+
+            merged_word = {'text': h_word, 'x0': head['x0'], 'x1': max_x1, 'top': head['top'], 'bottom': last_word['bottom']}
+            idx = add_entry(merged_word)
+            bisect.insort(columns.setdefault(math.floor(head['x0'] / column_width), []), (merged_word['top'], idx))
+
+    return [entries[idx] for idx in range(len(entries)) if alive[idx]]
+
+# Train numbers are above a route, its starting location is below it
+train_number_x_margin = 10
+train_number_y_margin = 1
+start_location_x_error = 1
+
+class WordIndex:
+    def __init__(self, words: list[dict]):
+        self.words = words
+
+        self.by_bottom = sorted((word['bottom'], i) for i, word in enumerate(words))
+        self.bottoms = [bottom for bottom, _ in self.by_bottom]
+
+        # Columns twice as wide as the allowed error, same as for vertical text
+        self.column_width = 2 * start_location_x_error
+        self.columns = {}
+        for i, word in enumerate(words):
+            self.columns.setdefault(math.floor(word['x0'] / self.column_width), []).append((word['top'], i))
+        for column in self.columns.values():
+            column.sort()
+
+    def find_train_number(self, rect: dict) -> str:
+        # Closest word above the rect, which lies horizontally within it
+        best_idx = None
+        best_dist = None
+
+        # Walk upwards starting just below the rect
+        i = bisect.bisect_right(self.bottoms, rect['top'] + train_number_y_margin + 1e-6) - 1
+        while i >= 0:
+            bottom, idx = self.by_bottom[i]
+            i -= 1
+
+            dist = rect['top'] - bottom
+            if dist < -train_number_y_margin:
                 continue
-            if word['text'] == 'Nach':
-                to_x = word['x0'] + 0.9125434179773038
+            if best_dist is not None and dist > best_dist:
+                break
+
+            word = self.words[idx]
+            if word['x0'] >= rect['x0'] - train_number_x_margin and word['x1'] <= rect['x1'] + train_number_x_margin:
+                if best_idx is None or idx < best_idx:
+                    best_idx = idx
+                    best_dist = dist
+
+        return self.words[best_idx]['text'] if best_idx is not None else None
+
+    def find_start_location(self, rect: dict) -> str:
+        # Closest word below the rect, which starts at the same position
+        best_idx = None
+        best_dist = None
+
+        rect_column = math.floor(rect['x0'] / self.column_width)
+        for column_idx in range(rect_column - 1, rect_column + 2):
+            column = self.columns.get(column_idx)
+            if not column:
                 continue
 
-            if word['top'] <= 50:
-                continue
+            # Walk downwards starting at the bottom of the rect
+            column_best_dist = None
+            i = bisect.bisect_left(column, (rect['bottom'],))
+            while i < len(column):
+                top, idx = column[i]
+                i += 1
+
+                dist = rect['bottom'] - top
+                if column_best_dist is not None and dist < column_best_dist:
+                    break
+                if not approx_equal(self.words[idx]['x0'], rect['x0'], start_location_x_error):
+                    continue
 
-            if word['text'] == '621':
-                pass
-
-            if word['top'] - curr_y > 45:
-                if curr_loco.number is not None:
-                    curr_loco.flush_lines(curr_prev_lines, curr_next_lines)
-                    locos.append(curr_loco)
-
-                curr_loco = Locomotive(None, None, None)
-
-            if approx_equal(word['x0'], loco_x, max_error=0.1):
-                if curr_loco.number is None:
-                    curr_loco.number = word['text']
-                    curr_prev_lines = []
-                    curr_next_lines = []
-                    curr_y = word['top']
-                    curr_prev_y = curr_next_y = 0
-                    loco_y.append(word['top'])
-                elif curr_loco.service_ident is None:
-                    if word['text'] == 'x_Dop' or word['text'] == '(x_Dop':
-                        curr_loco.service_ident = 'x_Doppeltraktion'
-                    elif word['text'].startswith('x_Dop'):
-                        curr_loco.service_ident = 'x_Doppeltraktion'
-                        curr_prev_lines.append(word['text'][len('x_Dop'):])
-                        curr_prev_y = word['top']
-                    elif word['text'].startswith('(x_Dop'):
-                        curr_loco.service_ident = 'x_Doppeltraktion'
-                        curr_prev_lines.append(word['text'][len('(x_Dop'):])
-                        curr_prev_y = word['top']
-                    else:
-                        curr_loco.service_ident = word['text'][1:-1]
+                column_best_dist = dist
+                if best_idx is None or dist > best_dist or (dist == best_dist and idx < best_idx):
+                    best_idx = idx
+                    best_dist = dist
+
+        return self.words[best_idx]['text'] if best_idx is not None else None
+
+def find_locomotive(loco_index: list[tuple[float, int]], rect: dict) -> int:
+    # Closest locomotive row starting above the rect
+    best_idx = None
+    best_dist = None
+
+    i = bisect.bisect_right(loco_index, (rect['top'], math.inf)) - 1
+    while i >= 0:
+        y, idx = loco_index[i]
+        i -= 1
+
+        dist = rect['top'] - y
+        if best_dist is not None and dist > best_dist:
+            break
+
+        if best_idx is None or idx < best_idx:
+            best_idx = idx
+            best_dist = dist
+
+    return best_idx
+
+def find_target_date(words):
+    for word in words:
+        m = re.match(r'(\d{2}).(\d{2}).(\d{4})\s*\[\w+\]', word['text'])
+        if m:
+            return m.groups()
+
+    return None
+
+def find_locomotives(words):
+    locos = []
+    loco_y = []
+    curr_loco = Locomotive(None, None, None)
+    curr_y = 0
+    curr_prev_lines = []
+    curr_prev_y = 0
+    curr_next_lines = []
+    curr_next_y = 0
+
+    loco_x = 0
+    from_x = 0
+    to_x = 0
+    for word in words:
+        if word['text'] == 'FZG':
+            loco_x = word['x0']
+            continue
+        if word['text'] == 'Von':
+            from_x = word['x0'] + 0.9125434179773606
+            continue
+        if word['text'] == 'Nach':
+            to_x = word['x0'] + 0.9125434179773038
+            continue
+
+        if word['top'] <= 50:
+            continue
+
+        if word['text'] == '621':
+            pass
+
+        if word['top'] - curr_y > 45:
+            if curr_loco.number is not None:
+                curr_loco.flush_lines(curr_prev_lines, curr_next_lines)
+                locos.append(curr_loco)
+
+            curr_loco = Locomotive(None, None, None)
+
+        if approx_equal(word['x0'], loco_x, max_error=0.1):
+            if curr_loco.number is None:
+                curr_loco.number = word['text']
+                curr_prev_lines = []
+                curr_next_lines = []
+                curr_y = word['top']
+                curr_prev_y = curr_next_y = 0
+                loco_y.append(word['top'])
+            elif curr_loco.service_ident is None:
+                if word['text'] == 'x_Dop' or word['text'] == '(x_Dop':
+                    curr_loco.service_ident = 'x_Doppeltraktion'
+                elif word['text'].startswith('x_Dop'):
+                    curr_loco.service_ident = 'x_Doppeltraktion'
+                    curr_prev_lines.append(word['text'][len('x_Dop'):])
+                    curr_prev_y = word['top']
+                elif word['text'].startswith('(x_Dop'):
+                    curr_loco.service_ident = 'x_Doppeltraktion'
+                    curr_prev_lines.append(word['text'][len('(x_Dop'):])
+                    curr_prev_y = word['top']
                 else:
-                    curr_loco.distance = int(word['text'][0:-3])
+                    curr_loco.service_ident = word['text'][1:-1]
+            else:
+                curr_loco.distance = int(word['text'][0:-3])
 
-            if approx_equal(word['x0'], from_x, max_error=0.1):
-                if word['top'] - curr_prev_y < 5:
-                    continue
-                if curr_prev_y != 0 and word['top'] - curr_prev_y > 10:
-                    curr_prev_lines.append('')
-                curr_prev_lines.append(word['text'])
-                curr_prev_y = word['top']
-
-            if approx_equal(word['x0'], to_x, max_error=0.1):
-                if curr_next_y != 0 and word['top'] - curr_next_y > 10:
-                    curr_next_lines.append('')
-                curr_next_lines.append(word['text'])
-                curr_next_y = word['top']
-        
-        if curr_loco.number is not None:
-            curr_loco.flush_lines(curr_prev_lines, curr_next_lines)
-            locos.append(curr_loco)
-
-        # Convert vertical into horizontal text
-        for word1 in words:
-            h_word = word1['text']
-            used_words = [word1]
-            last_word = word1
-            max_x1 = word1['x1']
-            changed = True
-            while changed:
-                changed = False
-                for word2 in words:
-                    if word1 == word2:
-                        continue
-                    if approx_equal(last_word['bottom'] - 0.95, word2['top'], 0.15) and approx_equal(word1['x0'], word2['x0'], 0.0001):
-                        h_word += word2['text']
-                        used_words.append(word2)
-                        last_word = word2
-                        max_x1 = max(max_x1, word2['x1'])
-                        changed = True
-                        break
-            if len(used_words) > 1:
-                words = [x for x in words if x not in used_words]
-                words.append({'text': h_word, 'x0': word1['x0'], 'x1': max_x1, 'top': word1['top'], 'bottom': last_word['bottom']})
-        
-        # Find time marking lines
-        hour0_x = None
-        hour24_x = None
-        for rect in page.rects:
-            # Identify based on usual attributes
-            if rect['height'] < 50 or not approx_equal(rect['top'], 60, max_error=3) or rect['non_stroking_color'] != (0.625, 0.625, 0.625):
+        if approx_equal(word['x0'], from_x, max_error=0.1):
+            if word['top'] - curr_prev_y < 5:
                 continue
+            if curr_prev_y != 0 and word['top'] - curr_prev_y > 10:
+                curr_prev_lines.append('')
+            curr_prev_lines.append(word['text'])
+            curr_prev_y = word['top']
+
+        if approx_equal(word['x0'], to_x, max_error=0.1):
+            if curr_next_y != 0 and word['top'] - curr_next_y > 10:
+                curr_next_lines.append('')
+            curr_next_lines.append(word['text'])
+            curr_next_y = word['top']
+    
+    if curr_loco.number is not None:
+        curr_loco.flush_lines(curr_prev_lines, curr_next_lines)
+        locos.append(curr_loco)
 
-            # Assumes they are orded in the PDF file, but they *should* be
-            if hour0_x is None:
-                hour0_x = rect['x0'] + rect['width']/2
-            # Some lines - including 24h - are a bit thiner
-            elif approx_equal(rect['width'], 0.84):
-                hour24_x = rect['x0'] + rect['width']/2
+    return locos, loco_y
+
+def find_hour_markers(rects):
+    hour0_x = None
+    hour24_x = None
+    for rect in rects:
+        # Identify based on usual attributes
+        if rect['height'] < 50 or not approx_equal(rect['top'], 60, max_error=3) or rect['non_stroking_color'] != (0.625, 0.625, 0.625):
+            continue
+
+        # Assumes they are orded in the PDF file, but they *should* be
+        if hour0_x is None:
+            hour0_x = rect['x0'] + rect['width']/2
+        # Some lines - including 24h - are a bit thiner
+        elif approx_equal(rect['width'], 0.84):
+            hour24_x = rect['x0'] + rect['width']/2
+
+    return hour0_x, hour24_x
+
+def associate_routes(locos, loco_y, words, rects):
+    word_index = WordIndex(words)
+    loco_index = sorted((y, i) for i, y in enumerate(loco_y))
+
+    # Find time marking lines
+    hour0_x, hour24_x = find_hour_markers(rects)
+
+    for i, rect in enumerate(rects):
+        # Remove general noise
+        if rect['top'] < 50 or rect['height'] > 10:
+            continue
+        # Guess based on usual height
+        if not (approx_equal(rect['height'], 5.16) or approx_equal(rect['height'], 5.28)):
+            continue
+        # They have a fill of black / gray / green
+        if not rect['fill'] or not (rect["non_stroking_color"] == (0.0, 0.0, 0.0) or rect["non_stroking_color"] == (0.0, 0.625, 0.0) or rect["non_stroking_color"] == (0.434082, 0.434082, 0.434082)):
+            continue  
+
+        # Remap from PDF position
+        start, end = remap(rect['x0'], hour0_x, hour24_x, 0, 24), remap(rect['x1'], hour0_x, hour24_x, 0, 24) 
+
+        # Find the appropriate train number
+        train_number = word_index.find_train_number(rect)
+
+        # Find starting point
+        starting = word_index.find_start_location(rect)
+
+        main_route = Route(starting, start, end, train_number)
+
+        # Associate route with a locomotive
+        loco_idx = find_locomotive(loco_index, rect)
+        loco = locos[loco_idx] if loco_idx is not None else None
+
+        if loco is None:
+            print(f"Unknown route: {main_route}")
+            continue
+
+        loco.routes.append(main_route)
+
+def parse_page(words, rects):
+    target_date = find_target_date(words)
+
+    # Find locomotives
+    locos, loco_y = find_locomotives(words)
+
+    # Convert vertical into horizontal text
+    words = merge_vertical_words(words)
+
+    associate_routes(locos, loco_y, words, rects)
+
+    return locos, target_date
+
+# Bump whenever the output of the parser changes, so cached results are redone
+parser_version = 2
+# Bump whenever the extracted page data changes, so PDFs are extracted again
+extraction_version = 1
+
+rect_keys = ['x0', 'x1', 'top', 'bottom', 'width', 'height', 'fill', 'non_stroking_color']
+
+def extract_page(page):
+    # Store words and rects as rows instead of dicts, which is a lot smaller
+    words = page.extract_words(keep_blank_chars=True)
+    word_keys = list(words[0].keys()) if len(words) != 0 else []
+
+    return {
+        "word_keys": word_keys,
+        "words": [[word[key] for key in word_keys] for word in words],
+        "rects": [[rect[key] for key in rect_keys] for rect in page.rects],
+    }
+
+def expand_page(page_data):
+    words = [dict(zip(page_data["word_keys"], row)) for row in page_data["words"]]
+    rects = [dict(zip(rect_keys, row)) for row in page_data["rects"]]
+
+    # Colors are compared against tuples, but are stored as lists
+    for rect in rects:
+        if isinstance(rect['non_stroking_color'], list):
+            rect['non_stroking_color'] = tuple(rect['non_stroking_color'])
 
-        for i, rect in enumerate(page.rects):
-            # Remove general noise
-            if rect['top'] < 50 or rect['height'] > 10:
-                continue
-            # Guess based on usual height
-            if not (approx_equal(rect['height'], 5.16) or approx_equal(rect['height'], 5.28)):
-                continue
-            # They have a fill of black / gray / green
-            if not rect['fill'] or not (rect["non_stroking_color"] == (0.0, 0.0, 0.0) or rect["non_stroking_color"] == (0.0, 0.625, 0.0) or rect["non_stroking_color"] == (0.434082, 0.434082, 0.434082)):
-                continue  
-
-            # Remap from PDF position
-            start, end = remap(rect['x0'], hour0_x, hour24_x, 0, 24), remap(rect['x1'], hour0_x, hour24_x, 0, 24) 
-
-            # Find the appropriate train number
-            train_number = None
-            min_dist = float("inf")
-            for i, word in enumerate(words):
-                dist = rect['top'] - word['bottom']
-                if word['x0'] >= rect['x0'] - 10 and word['x1'] <= rect['x1'] + 10 and dist >= -1 and dist < min_dist:
-                    train_number = word['text']
-                    min_dist = dist
-                
-            # Find starting point
-            starting = None
-            min_dist = float("-inf")
-            for word in words:
-                dist = rect['bottom'] - word['top']
-                if approx_equal(word['x0'], rect['x0'], 1) and dist <= 0 and dist > min_dist:
-                    starting = word['text']
-                    min_dist = dist
-            
-            main_route = Route(starting, start, end, train_number)
-
-            # Associate route with a locomotive
-            min_dist = float("inf")
-            loco = None
-            for i, y in enumerate(loco_y):
-                dist = rect['top'] - y
-                if dist >= 0 and dist < min_dist:
-                    loco = locos[i]
-                    min_dist = dist
-
-            if loco is None:
-                print(f"Unknown route: {main_route}")
-                continue
+    return words, rects
+
+def parse_pages(input_path, page_numbers, keep_pages=False):
+    # Runs inside a worker process, so the PDF has to be opened again
+    page_results = []
+    with pdfplumber.open(input_path) as pdf:
+        for i in page_numbers:
+            page_data = extract_page(pdf.pages[i])
+            page_results.append((parse_page(*expand_page(page_data)), page_data if keep_pages else None))
 
-            loco.routes.append(main_route)
+    return page_results
 
+def merge_page_results(page_results):
+    # Pages are in order, the first page with a date decides it
+    all_locos = []
+    target_date = None
+    for locos, page_date in page_results:
         all_locos += locos
-        # break
+        if not target_date:
+            target_date = page_date
+
+    return all_locos, target_date
 
+def collect_result(all_locos):
     result = {}
     trains = {}
 
@@ -382,12 +601,234 @@ def main(input_path, output_dir):
             } for loco_number in routes], key=lambda loco: loco["position"]),
         })
 
-    with open(os.path.join(output_dir, f"{target_date[2]}_{target_date[1]}_{target_date[0]}.json"), "w") as f:
+    return result
+
+def dump_indexed(result):
+    # Same as json.dumps(result), while keeping track of where every locomotive and train is
+    locomotive_offsets = []
+    train_offsets = []
+
+    parts = []
+    offset = 0
+    def append(text):
+        nonlocal offset
+        parts.append(text)
+        offset += len(text)
+
+    append("{")
+    for i, (key, value) in enumerate(result.items()):
+        if i != 0:
+            append(", ")
+        append(f"{json.dumps(key)}: ")
+
+        if key not in ("locomotives", "trains"):
+            append(json.dumps(value))
+            continue
+
+        offsets = locomotive_offsets if key == "locomotives" else train_offsets
+        append("[")
+        for j, entry in enumerate(value):
+            if j != 0:
+                append(", ")
+            text = json.dumps(entry)
+            offsets.append((offset, len(text)))
+            append(text)
+        append("]")
+    append("}")
+
+    return "".join(parts), locomotive_offsets, train_offsets
+
+def create_lookup_index(result, data_file, locomotive_offsets, train_offsets):
+    # Trains are looked up by number and then by departure minute, locomotives by number
+    index = {
+        "data_file": data_file,
+        "trains": {},
+        "locomotives": {},
+    }
+
+    for train, (offset, length) in zip(result["trains"], train_offsets):
+        departure_minute = train["departure_time"]["hour"] * 60 + train["departure_time"]["minute"]
+        index["trains"].setdefault(train["number"], []).append([departure_minute, offset, length])
+
+    for loco, (offset, length) in zip(result["locomotives"], locomotive_offsets):
+        index["locomotives"].setdefault(str(loco["number"]), []).append([offset, length])
+
+    return index
+
+def write_result(result, target_date, output_dir):
+    output_paths = [
+        os.path.join(output_dir, f"{target_date[2]}_{target_date[1]}_{target_date[0]}.json"),
+        os.path.join(output_dir, f"{target_date[2]}_{target_date[1]}_{target_date[0]}.min.json"),
+        os.path.join(output_dir, f"{target_date[2]}_{target_date[1]}_{target_date[0]}.index.json"),
+    ]
+
+    with open(output_paths[0], "w") as f:
         json.dump(result, f, indent=4)
-    with open(os.path.join(output_dir, f"{target_date[2]}_{target_date[1]}_{target_date[0]}.min.json"), "w") as f:
-        json.dump(result, f)
 
-if __name__ == "__main__":
-    main(sys.argv[1], "../data/locomotive_allocations")
+    # Output is pure ASCII, so character offsets are also byte offsets
+    min_json, locomotive_offsets, train_offsets = dump_indexed(result)
+    with open(output_paths[1], "w") as f:
+        f.write(min_json)
+    with open(output_paths[2], "w") as f:
+        json.dump(create_lookup_index(result, os.path.basename(output_paths[1]), locomotive_offsets, train_offsets), f, separators=(",", ":"))
+
+    return output_paths
+
+class ParseCache:
+    # Everything is keyed by the content of the PDF, not its file name
+    def __init__(self, cache_dir, input_path):
+        self.cache_dir = cache_dir
+        self.input_path = input_path
+
+        with open(input_path, "rb") as f:
+            self.digest = hashlib.file_digest(f, "sha256").hexdigest()
+
+        self.pages_path = os.path.join(cache_dir, f"{self.digest}.pages.json.gz")
+        self.result_path = os.path.join(cache_dir, f"{self.digest}.result.json")
+
+    def is_current(self, output_dir):
+        # Up-to-date when the outputs of the current parser version are in the output directory and newer than the PDF
+        try:
+            with open(self.result_path, "r") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if record["parser_version"] != parser_version:
+            return False
+
+        output_dir = os.path.abspath(output_dir)
+        if any(os.path.dirname(path) != output_dir for path in record["output_paths"]):
+            return False
+
+        input_mtime = os.path.getmtime(self.input_path)
+        return all(os.path.exists(path) and os.path.getmtime(path) >= input_mtime for path in record["output_paths"])
+
+    def load_pages(self):
+        try:
+            with gzip.open(self.pages_path, "rt") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if cached["extraction_version"] != extraction_version:
+            return None
+        return cached["pages"]
+
+    def store_pages(self, pages):
+        self.write_atomic(self.pages_path, {"extraction_version": extraction_version, "pages": pages}, compress=True)
+
+    def store_result(self, output_paths):
+        self.write_atomic(self.result_path, {"parser_version": parser_version, "output_paths": [os.path.abspath(path) for path in output_paths]})
+
+    def write_atomic(self, path, data, compress=False):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with (gzip.open(temp_path, "wt") if compress else open(temp_path, "w")) as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+def main(input_path, output_dir, jobs=1, cache_dir=None, force=False):
+    cache = ParseCache(cache_dir, input_path) if cache_dir else None
+    if cache and not force and cache.is_current(output_dir):
+        print(f"Already parsed '{input_path}' with parser version {parser_version}")
+        return None
+
+    pages = cache.load_pages() if cache else None
+    if pages is not None:
+        # Only the geometry needs to be redone
+        page_results = [parse_page(*expand_page(page_data)) for page_data in pages]
+    else:
+        with pdfplumber.open(input_path) as pdf:
+            page_count = len(pdf.pages)
+
+        # Distribute pages round-robin, so every worker gets a similar amount of work
+        worker_count = max(1, jobs)
+        worker_pages = [list(range(page_count))[i::worker_count] for i in range(worker_count)]
+
+        page_results = [None] * page_count
+        pages = [None] * page_count
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [executor.submit(parse_pages, input_path, page_numbers, cache is not None) for page_numbers in worker_pages if page_numbers]
+                worker_results = [future.result() for future in futures]
+        else:
+            worker_results = [parse_pages(input_path, worker_pages[0], cache is not None)]
+
+        for page_numbers, results in zip(worker_pages, worker_results):
+            for page_number, (page_result, page_data) in zip(page_numbers, results):
+                page_results[page_number] = page_result
+                pages[page_number] = page_data
+
+        if cache:
+            cache.store_pages(pages)
+
+    all_locos, target_date = merge_page_results(page_results)
+    output_paths = write_result(collect_result(all_locos), target_date, output_dir)
+    if cache:
+        cache.store_result(output_paths)
+
+    return len(page_results)
+
+def find_pdfs(inputs):
+    # Accepts files, directories and glob patterns
+    input_paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            input_paths += glob.glob(os.path.join(pattern, "*.pdf"))
+        elif os.path.isfile(pattern):
+            input_paths.append(pattern)
+        else:
+            input_paths += glob.glob(pattern)
 
+    return sorted(set(input_paths))
 
+def batch_main(input_paths, output_dir, jobs=1, cache_dir=None, force=False):
+    if cache_dir is None:
+        print("No cache directory given, so all PDFs have to be parsed")
+
+    pending_paths = [path for path in input_paths if force or cache_dir is None or not ParseCache(cache_dir, path).is_current(output_dir)]
+    print(f"Parsing {len(pending_paths)} of {len(input_paths)} PDFs with {jobs} processes")
+
+    start_time = time.perf_counter()
+    page_count = 0
+    failures = []
+
+    # Each worker parses whole PDFs, so pdfplumber is only imported once per process
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {executor.submit(main, path, output_dir, 1, cache_dir, True): path for path in pending_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                page_count += future.result()
+                print(f"Parsed '{path}'")
+            except Exception as e:
+                failures.append((path, e))
+                print(f"Failed to parse '{path}': {e}")
+
+    duration = time.perf_counter() - start_time
+    parsed_count = len(pending_paths) - len(failures)
+
+    print(f"Parsed {parsed_count} PDFs ({page_count} pages) in {duration:.1f}s, "
+          f"{parsed_count / duration if duration > 0 else 0:.2f} PDFs/s, {page_count / duration if duration > 0 else 0:.1f} pages/s")
+    print(f"Skipped {len(input_paths) - len(pending_paths)} up-to-date PDFs, {len(failures)} failed")
+    for path, e in failures:
+        print(f" - {path}: {type(e).__name__}: {e}")
+
+    return len(failures) == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse RhB locomotive allocation PDFs into JSON")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="../data/locomotive_allocations")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of processes to parse pages or PDFs with")
+    parser.add_argument("-c", "--cache-dir", default=None, help="directory to cache extracted PDF contents and results in")
+    parser.add_argument("-f", "--force", action="store_true", help="parse again, even if the cached result is current")
+    args = parser.parse_args()
+
+    input_paths = find_pdfs(args.inputs)
+    if len(args.inputs) == 1 and input_paths == [args.inputs[0]]:
+        main(args.inputs[0], args.output_dir, args.jobs, args.cache_dir, args.force)
+    elif not batch_main(input_paths, args.output_dir, args.jobs, args.cache_dir, args.force):
+        sys.exit(1)
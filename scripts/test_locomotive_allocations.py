@@ -0,0 +1,147 @@
+import io
+import os
+import sys
+import time
+import json
+import gzip
+import argparse
+import contextlib
+
+import rich
+import rich.markup
+from rich.table import Table
+
+import pdfplumber
+
+import parse_locomotive_allocations as parse
+
+fixture_dir = "fixtures/locomotive_allocations"
+
+
+def snapshot(input_path: str, name: str, page_numbers: list[int] | None):
+    # Store extracted pages, so the suite doesn't need the PDF anymore
+    with pdfplumber.open(input_path) as pdf:
+        if page_numbers is None:
+            page_numbers = list(range(len(pdf.pages)))
+        pages = [parse.extract_page(pdf.pages[i]) for i in page_numbers]
+
+    os.makedirs(fixture_dir, exist_ok=True)
+    with gzip.open(os.path.join(fixture_dir, f"{name}.pages.json.gz"), "wt") as f:
+        json.dump({"extraction_version": parse.extraction_version, "pages": pages}, f)
+
+    rich.print(f"[bold]Stored {len(pages)} pages of {rich.markup.escape(input_path)} as '{rich.markup.escape(name)}'")
+    update_golden(name)
+
+
+def load_pages(name: str):
+    with gzip.open(os.path.join(fixture_dir, f"{name}.pages.json.gz"), "rt") as f:
+        return [parse.expand_page(page_data) for page_data in json.load(f)["pages"]]
+
+
+def run_parser(pages: list[tuple[list[dict], list[dict]]]):
+    # Same entry points as main, so the golden output covers the order of the steps too
+    all_locos, target_date = parse.merge_page_results([parse.parse_page(words, rects) for words, rects in pages])
+    return parse.collect_result(all_locos), target_date
+
+
+def time_parser(pages: list[tuple[list[dict], list[dict]]], timings: dict[str, float]):
+    # Same steps as parse_page, but timing each one
+    def timed(step, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[step] = timings.get(step, 0.0) + time.perf_counter() - start
+        return result
+
+    all_locos = []
+    for words, rects in pages:
+        locos, loco_y = timed("locomotives", parse.find_locomotives, words)
+        merged_words = timed("vertical merge", parse.merge_vertical_words, words)
+        timed("routes", parse.associate_routes, locos, loco_y, merged_words, rects)
+
+        all_locos += locos
+
+    timed("trains", parse.collect_result, all_locos)
+
+
+def update_golden(name: str):
+    result, target_date = run_parser(load_pages(name))
+
+    with open(os.path.join(fixture_dir, f"{name}.golden.json"), "w") as f:
+        json.dump({"target_date": target_date, "result": result}, f, indent=4)
+
+    rich.print(f"[bold yellow]Updated golden output of '{rich.markup.escape(name)}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks and times the locomotive allocation parser against stored fixtures")
+    parser.add_argument("--snapshot", nargs=2, metavar=("PDF", "NAME"), help="store pages of a PDF as a new fixture")
+    parser.add_argument("--pages", type=lambda x: [int(i) - 1 for i in x.split(",")], help="comma separated page numbers to snapshot, starting at 1")
+    parser.add_argument("--update", action="store_true", help="overwrite the golden outputs with the current parser output")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed runs per fixture")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        snapshot(args.snapshot[0], args.snapshot[1], args.pages)
+        return
+
+    if not os.path.exists(fixture_dir):
+        rich.print(f"[bold red]No fixtures found in '{fixture_dir}', create them with --snapshot")
+        sys.exit(1)
+
+    names = sorted(file.removesuffix(".pages.json.gz") for file in os.listdir(fixture_dir) if file.endswith(".pages.json.gz"))
+    steps = ["locomotives", "vertical merge", "routes", "trains"]
+
+    table = Table(title="Parser timings (best of %d)" % args.repeat)
+    table.add_column("Fixture")
+    table.add_column("Pages", justify="right")
+    table.add_column("Words", justify="right")
+    for step in steps:
+        table.add_column(f"{step.capitalize()} (ms)", justify="right")
+
+    failed = False
+    for name in names:
+        if args.update:
+            update_golden(name)
+
+        pages = load_pages(name)
+
+        ## Check against golden output
+        with open(os.path.join(fixture_dir, f"{name}.golden.json"), "r") as f:
+            golden = json.load(f)
+
+        result, target_date = run_parser(pages)
+        # Round-trip through JSON, so tuples and lists compare equal
+        actual = json.loads(json.dumps({"target_date": target_date, "result": result}))
+
+        if actual == golden:
+            rich.print(f"[bold green]✓ PASSED[/bold green] [green]{rich.markup.escape(name)}")
+        else:
+            failed = True
+            rich.print(f"[bold red]✕ FAILED[/bold red] [red]{rich.markup.escape(name)}")
+            if golden["target_date"] != actual["target_date"]:
+                rich.print(f"  Target date is {actual['target_date']} instead of {golden['target_date']}")
+            for key in ["locomotives", "trains"]:
+                expected_entries, actual_entries = golden["result"][key], actual["result"][key]
+                mismatches = sum(1 for a, b in zip(expected_entries, actual_entries) if a != b) + abs(len(expected_entries) - len(actual_entries))
+                if mismatches != 0:
+                    rich.print(f"  {mismatches} of {len(expected_entries)} {key} differ")
+
+        ## Time the geometry steps
+        best_timings = {}
+        for _ in range(args.repeat):
+            timings = {}
+            # Warnings about unknown routes were already shown by the check
+            with contextlib.redirect_stdout(io.StringIO()):
+                time_parser(pages, timings)
+            for step in steps:
+                best_timings[step] = min(best_timings.get(step, float("inf")), timings[step])
+
+        table.add_row(name, str(len(pages)), str(sum(len(words) for words, _ in pages)), *[f"{best_timings[step]*1000:.2f}" for step in steps])
+
+    rich.print(table)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
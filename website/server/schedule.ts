@@ -80,6 +80,13 @@ type LocomotiveAllocations = {
     locomotives: LocomotiveAllocationEntry[]
     trains: TrainAllocationEntry[] 
 }
+type LocomotiveAllocationIndex = {
+    data_file: string
+    // Train number -> [departure minute, offset, length]
+    trains: { [number: string]: [number, number, number][] }
+    // Locomotive number -> [offset, length]
+    locomotives: { [number: string]: [number, number][] }
+}
 
 function jsonMomementReceiver(_: string, value: any) {
     // Manually parse moments
@@ -161,11 +168,54 @@ export function getTrainsInTimespan(startMoment: moment.Moment, endMoment: momen
             }))
 }
 
-let allocationCache: { [key: string]: LocomotiveAllocations | null } = ({})
-export function getLocomotives(train: Train, time: moment.Moment): Locomotive[] {
-    // Search for train in day's allocations
-    const allocationPath = path.join(allocationDir, `${time.format('YYYY_MM_DD')}.min.json`)
+type CachedAllocationIndex = {
+    index: LocomotiveAllocationIndex
+    // Offsets are only valid for the data file they were created with
+    dataModified: number
+    dataSize: number
+}
+
+let allocationIndexCache: { [key: string]: CachedAllocationIndex | null } = ({})
+function readAllocationIndex(indexPath: string): LocomotiveAllocationIndex | null {
+    let indexEntry: CachedAllocationIndex | null | undefined = allocationIndexCache[indexPath]
+    if (indexEntry) {
+        // Reload once the day was parsed again
+        try {
+            const dataStat = fs.statSync(path.join(path.dirname(indexPath), indexEntry.index.data_file))
+            if (dataStat.mtimeMs != indexEntry.dataModified || dataStat.size != indexEntry.dataSize) {
+                indexEntry = undefined
+            }
+        } catch (err) {
+            indexEntry = undefined
+        }
+    }
+
+    if (indexEntry == undefined) {
+        try {
+            const indexFile = fs.readFileSync(indexPath, { encoding: 'utf-8' })
+            const index = JSON.parse(indexFile) as LocomotiveAllocationIndex
+            const dataStat = fs.statSync(path.join(path.dirname(indexPath), index.data_file))
+            allocationIndexCache[indexPath] = indexEntry = { index, dataModified: dataStat.mtimeMs, dataSize: dataStat.size }
+        } catch (err) {
+            // Older allocations don't have an index
+            allocationIndexCache[indexPath] = indexEntry = null
+        }
+    }
+    return indexEntry?.index ?? null
+}
+function readAllocationRecord<T>(dataPath: string, offset: number, length: number): T {
+    const fd = fs.openSync(dataPath, 'r')
+    try {
+        const buffer = Buffer.alloc(length)
+        fs.readSync(fd, buffer, 0, length, offset)
+        return JSON.parse(buffer.toString('utf-8'), jsonMomementReceiver) as T
+    } finally {
+        fs.closeSync(fd)
+    }
+}
 
+let allocationCache: { [key: string]: LocomotiveAllocations | null } = ({})
+function readAllocations(allocationPath: string): LocomotiveAllocations | null {
     let allocationEntry = allocationCache[allocationPath]
     if (allocationEntry == undefined) {
         try {
@@ -180,17 +230,45 @@ export function getLocomotives(train: Train, time: moment.Moment): Locomotive[]
             allocationCache[allocationPath] = allocationEntry = null
         }
     }
-    if (!allocationEntry) return []
+    return allocationEntry
+}
 
+export function getLocomotives(train: Train, time: moment.Moment): Locomotive[] {
     const minTimeHM = train.arrival_time || train.transit_time
     const maxTimeHM = train.departure_time || train.transit_time
 
     const minTime = minTimeHM ? minTimeHM.hour*60 + minTimeHM.minute : null
     const maxTime = maxTimeHM ? maxTimeHM.hour*60 + maxTimeHM.minute : null
 
-    const allocatedTrain = allocationEntry.trains.find(t => t.number == train.number
+    const isAllocatedTrain = (t: TrainAllocationEntry) => t.number == train.number
         && (!minTime || (t.departure_time.hour*60 + t.departure_time.minute) <= minTime)
-        && (!maxTime || (t.arrival_time.hour*60 + t.arrival_time.minute) >= maxTime))
+        && (!maxTime || (t.arrival_time.hour*60 + t.arrival_time.minute) >= maxTime)
+
+    let allocatedTrain: TrainAllocationEntry | undefined
+    const indexPath = path.join(allocationDir, `${time.format('YYYY_MM_DD')}.index.json`)
+    let allocationIndex = readAllocationIndex(indexPath)
+    if (allocationIndex) {
+        // Only read the records of trains with the same number
+        const dataPath = path.join(allocationDir, allocationIndex.data_file)
+        try {
+            allocatedTrain = (allocationIndex.trains[train.number] ?? [])
+                .filter(([departureMinute]) => !minTime || departureMinute <= minTime)
+                .map(([, offset, length]) => readAllocationRecord<TrainAllocationEntry>(dataPath, offset, length))
+                .find(isAllocatedTrain)
+        } catch (err) {
+            // The day is being parsed again, so the index doesn't match the data file yet
+            logger.warn(`Locomotive allocation index '${indexPath}' doesn't match its data file`)
+            delete allocationIndexCache[indexPath]
+            allocationIndex = null
+        }
+    }
+    if (!allocationIndex) {
+        // Search for train in day's allocations
+        const allocationEntry = readAllocations(path.join(allocationDir, `${time.format('YYYY_MM_DD')}.min.json`))
+        if (!allocationEntry) return []
+
+        allocatedTrain = allocationEntry.trains.find(isAllocatedTrain)
+    }
     if (!allocatedTrain) return []
 
     return allocatedTrain.locomotives.map(loco => ({